@@ -1,14 +1,24 @@
 import os
 import json
+import gzip
+import itertools
+import re
+import uuid
 import subprocess
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Query
 from fastapi.responses import JSONResponse, FileResponse
 import logging
 import time
+import threading
+import signal
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 from datetime import datetime
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Iterable, Iterator
 
 # OpenAI and PDF
 from openai import OpenAI
@@ -29,6 +39,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip responses (e.g. paginated run output) for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 V2_DIR = os.path.join(os.path.dirname(__file__), '..', 'v2')
 EXE_PATH = os.path.join(V2_DIR, 'neova-apexred.exe')
@@ -91,76 +103,652 @@ def ensure_aws_env():
         raise RuntimeError(f"Missing required AWS environment variables: {', '.join(missing)}")
     logging.info("All required AWS environment variables are present.")
 
+# Attack and detection logs are stored as JSON Lines (one compact record per line) so they can be
+# filtered and summarized as a stream. Set LOGS_GZIP=true to gzip-compress newly written logs.
+LOG_EXTENSIONS = (".jsonl.gz", ".jsonl", ".json")
+
+def _log_filename(stem: str) -> str:
+    compress = os.getenv("LOGS_GZIP", "false").strip().lower() in ("1", "true", "yes")
+    return stem + (".jsonl.gz" if compress else ".jsonl")
+
+def _open_log(path: str, mode: str = "rt", compressed: bool = None):
+    if compressed is None:
+        compressed = path.endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _find_log(directory: str, stem: str) -> str:
+    """Return the most recently written log for stem in any supported format (JSONL path if none exist)."""
+    candidates = [os.path.join(directory, stem + ext) for ext in LOG_EXTENSIONS]
+    existing = [c for c in candidates if os.path.exists(c)]
+    if not existing:
+        return os.path.join(directory, _log_filename(stem))
+    return max(existing, key=os.path.getmtime)
+
+def iter_log_records(path: str) -> Iterator[Any]:
+    """Yield records from a log file.
+
+    .jsonl / .jsonl.gz files are streamed line by line in constant memory. Legacy .json documents
+    are loaded whole and unwrapped: CloudTrail {"Events": [...]} and top-level lists yield their items.
+    """
+    if path.endswith((".jsonl", ".jsonl.gz")):
+        with _open_log(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    with _open_log(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get("Events"), list):
+        yield from data["Events"]
+    elif isinstance(data, list):
+        yield from data
+    else:
+        yield data
+
+def write_log_records(path: str, records: Iterable[Any]) -> int:
+    """Stream records to path as JSON Lines (gzip if path ends in .gz), replacing it atomically."""
+    # Unique temp file per writer, so concurrent writers to the same log never share one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    count = 0
+    try:
+        with _open_log(tmp_path, "wt", compressed=path.endswith(".gz")) as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")))
+                f.write("\n")
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return count
+
+# Detection coverage rollups, maintained incrementally as runs and detection fetches complete
+COVERAGE_FILE = os.path.join(os.path.dirname(__file__), "coverage.json")
+_coverage_lock = threading.Lock()
+
+# CloudTrail EventNames that evidence each technique's detonation (from the technique docs'
+# "Detonation logs" sections, minus generic calls such as AssumeRole or DescribeInstances).
+# Runs of techniques not listed here are counted as "unknown" rather than detected or missed.
+TECHNIQUE_DETECTION_EVENTS = {
+    "aws.credential-access.ec2-get-password-data": {"GetPasswordData"},
+    "aws.credential-access.ec2-steal-instance-credentials": {"SendCommand"},
+    "aws.credential-access.secretsmanager-batch-retrieve-secrets": {"BatchGetSecretValue"},
+    "aws.credential-access.secretsmanager-retrieve-secrets": {"GetSecretValue"},
+    "aws.credential-access.ssm-retrieve-securestring-parameters": {"GetParameters"},
+    "aws.defense-evasion.cloudtrail-delete": {"DeleteTrail"},
+    "aws.defense-evasion.cloudtrail-event-selectors": {"PutEventSelectors"},
+    "aws.defense-evasion.cloudtrail-lifecycle-rule": {"PutBucketLifecycle"},
+    "aws.defense-evasion.cloudtrail-stop": {"StopLogging"},
+    "aws.defense-evasion.dns-delete-logs": {"DeleteResolverQueryLogConfig"},
+    "aws.defense-evasion.organizations-leave": {"LeaveOrganization"},
+    "aws.defense-evasion.vpc-remove-flow-logs": {"DeleteFlowLogs"},
+    "aws.discovery.ec2-download-user-data": {"DescribeInstanceAttribute"},
+    "aws.discovery.ses-enumerate": {"GetAccountSendingEnabled", "ListIdentities"},
+    "aws.execution.ec2-launch-unusual-instances": {"RunInstances"},
+    "aws.execution.ec2-user-data": {"ModifyInstanceAttribute"},
+    "aws.execution.ssm-send-command": {"SendCommand"},
+    "aws.execution.ssm-start-session": {"StartSession"},
+    "aws.exfiltration.ec2-security-group-open-port-22-ingress": {"AuthorizeSecurityGroupIngress"},
+    "aws.exfiltration.ec2-share-ami": {"ModifyImageAttribute"},
+    "aws.exfiltration.ec2-share-ebs-snapshot": {"ModifySnapshotAttribute"},
+    "aws.exfiltration.rds-share-snapshot": {"ModifyDBSnapshotAttribute"},
+    "aws.exfiltration.s3-backdoor-bucket-policy": {"PutBucketPolicy"},
+    "aws.impact.bedrock-invoke-model": {"InvokeModel"},
+    "aws.impact.s3-ransomware-batch-deletion": {"DeleteObjects"},
+    "aws.impact.s3-ransomware-client-side-encryption": {"PutObject"},
+    "aws.impact.s3-ransomware-individual-deletion": {"DeleteObject"},
+    "aws.initial-access.console-login-without-mfa": {"ConsoleLogin"},
+    "aws.lateral-movement.ec2-instance-connect": {"SendSSHPublicKey"},
+    "aws.lateral-movement.ec2-serial-console-send-ssh-public-key": {"SendSerialConsoleSSHPublicKey"},
+    "aws.persistence.iam-backdoor-role": {"UpdateAssumeRolePolicy"},
+    "aws.persistence.iam-backdoor-user": {"CreateAccessKey"},
+    "aws.persistence.iam-create-admin-user": {"CreateUser", "AttachUserPolicy"},
+    "aws.persistence.iam-create-backdoor-role": {"CreateRole", "AttachRolePolicy"},
+    "aws.persistence.iam-create-user-login-profile": {"CreateLoginProfile"},
+    "aws.persistence.lambda-backdoor-function": {"AddPermission20150331v2"},
+    "aws.persistence.lambda-layer-extension": {"UpdateFunctionConfiguration20150331v2"},
+    "aws.persistence.lambda-overwrite-code": {"UpdateFunctionCode20150331v2"},
+    "aws.persistence.rolesanywhere-create-trust-anchor": {"CreateTrustAnchor"},
+    "aws.persistence.sts-federation-token": {"GetFederationToken"},
+    "aws.privilege-escalation.iam-update-user-login-profile": {"UpdateLoginProfile"},
+}
+# Seconds a run stays pending before it is given up on (CloudTrail delivery lags by minutes),
+# overridable via DETECTION_WINDOW_SECONDS. An expired run counts as missed if a fetch looked up its
+# events, and as unknown if no fetch ever queried them.
+DETECTION_WINDOW_DEFAULT = 1800
+
+def _detection_window() -> float:
+    value = os.getenv("DETECTION_WINDOW_SECONDS", "")
+    try:
+        window = float(value) if value else DETECTION_WINDOW_DEFAULT
+    except ValueError:
+        window = -1
+    if not 0 < window < float("inf"):
+        if value:
+            logging.warning(f"Invalid DETECTION_WINDOW_SECONDS={value!r}, using default.")
+        window = DETECTION_WINDOW_DEFAULT
+    return window
+
+def _empty_rollup() -> Dict[str, Any]:
+    return {
+        "runs": 0, "detected": 0, "missed": 0, "unknown": 0,
+        "last_detected_at": None, "ttd_total_seconds": 0.0, "tte_total_seconds": 0.0,
+    }
+
+def _load_coverage() -> Dict[str, Any]:
+    if os.path.exists(COVERAGE_FILE):
+        try:
+            with open(COVERAGE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"Could not read {COVERAGE_FILE}: {e}. Starting with empty coverage.")
+    return {"techniques": {}, "tactics": {}, "pending": []}
+
+_coverage = _load_coverage()
+
+def _save_coverage() -> None:
+    """Persist rollups atomically. Caller must hold _coverage_lock."""
+    tmp_path = COVERAGE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_coverage, f)
+    os.replace(tmp_path, COVERAGE_FILE)
+
+def _technique_tactic(technique_id: str) -> str:
+    # Stratus IDs look like <platform>.<tactic>.<name>, e.g. aws.defense-evasion.cloudtrail-stop
+    parts = technique_id.split(".")
+    return parts[1] if len(parts) >= 3 else "unknown"
+
+def _rollups_for(technique_id: str) -> List[Dict[str, Any]]:
+    return [
+        _coverage["techniques"].setdefault(technique_id, _empty_rollup()),
+        _coverage["tactics"].setdefault(_technique_tactic(technique_id), _empty_rollup()),
+    ]
+
+def _event_epoch(event: Dict[str, Any]):
+    """Return a CloudTrail event's EventTime as epoch seconds (AWS CLI v1 emits numbers, v2 ISO strings)."""
+    value = event.get("EventTime")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+def record_attack_run(technique_id: str, detonated_at: float) -> None:
+    """Count a completed run and queue it for resolution by later detection fetches."""
+    with _coverage_lock:
+        mapped = technique_id in TECHNIQUE_DETECTION_EVENTS
+        for rollup in _rollups_for(technique_id):
+            rollup["runs"] += 1
+            if not mapped:
+                rollup["unknown"] = rollup.get("unknown", 0) + 1
+        if mapped:
+            _coverage["pending"].append({"technique_id": technique_id, "detonated_at": detonated_at})
+        else:
+            logging.info(f"No detection events mapped for {technique_id}; coverage recorded as unknown.")
+        _save_coverage()
+
+def record_detection_fetch(events: List[Dict[str, Any]], fetched_at: float, queried_event_names: Iterable[str]) -> None:
+    """Resolve pending runs against the events of a completed fetch.
+
+    Only runs whose expected EventNames were among queried_event_names can be resolved; a run is
+    detected by the earliest unused expected event with EventTime at or after detonation. The fetch
+    that first sees that event marks the detection: time-to-detect and last-detected time use
+    fetched_at, while the attack call's own EventTime feeds the separate time-to-event figure.
+    Unresolved runs stay pending until the detection window has passed, then count as missed if
+    their events were queried by this fetch, or as unknown otherwise.
+    """
+    queried = set(queried_event_names)
+    # Events without a parseable timestamp cannot be placed relative to a run and are ignored
+    timed_events = sorted(
+        (t, e.get("EventName")) for t, e in ((_event_epoch(e), e) for e in events) if t is not None
+    )
+    window = _detection_window()
+    used = set()
+    with _coverage_lock:
+        still_pending = []
+        for run in sorted(_coverage["pending"], key=lambda r: r["detonated_at"]):
+            expected = TECHNIQUE_DETECTION_EVENTS.get(run["technique_id"], set()) & queried
+            match = next(
+                (i for i, (t, name) in enumerate(timed_events)
+                 if i not in used and name in expected and t >= run["detonated_at"]),
+                None,
+            )
+            expired = fetched_at - run["detonated_at"] > window
+            if match is not None:
+                used.add(match)
+                event_time = timed_events[match][0]
+                for rollup in _rollups_for(run["technique_id"]):
+                    rollup["detected"] += 1
+                    rollup["last_detected_at"] = max(rollup["last_detected_at"] or 0, fetched_at)
+                    rollup["ttd_total_seconds"] += fetched_at - run["detonated_at"]
+                    rollup["tte_total_seconds"] = rollup.get("tte_total_seconds", 0.0) + event_time - run["detonated_at"]
+            elif expired:
+                outcome = "missed" if expected else "unknown"
+                for rollup in _rollups_for(run["technique_id"]):
+                    rollup[outcome] = rollup.get(outcome, 0) + 1
+            else:
+                still_pending.append(run)
+        _coverage["pending"] = still_pending
+        _save_coverage()
+
+def _format_rollup(name: str, rollup: Dict[str, Any]) -> Dict[str, Any]:
+    last = rollup["last_detected_at"]
+    return {
+        "id": name,
+        "runs": rollup["runs"],
+        "detected": rollup["detected"],
+        "missed": rollup["missed"],
+        "unknown": rollup.get("unknown", 0),
+        "last_detected_at": datetime.fromtimestamp(last).isoformat() if last else None,
+        # Detonation until the fetch that first surfaced the event
+        "mean_time_to_detect_seconds": (
+            round(rollup["ttd_total_seconds"] / rollup["detected"], 2) if rollup["detected"] else None
+        ),
+        # Detonation until the attack call's own CloudTrail EventTime
+        "mean_time_to_event_seconds": (
+            round(rollup.get("tte_total_seconds", 0.0) / rollup["detected"], 2) if rollup["detected"] else None
+        ),
+    }
+
+# Single-flight: concurrent identical requests share one execution instead of repeating cloud work
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+
+def _normalize_payload(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize_payload(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize_payload(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+def single_flight(endpoint: str, payload: Dict[str, Any], fn):
+    """Run fn once per (endpoint, normalized payload); concurrent callers wait for and share its result."""
+    key = f"{endpoint}:{json.dumps(_normalize_payload(payload), sort_keys=True, default=str)}"
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _Flight()
+            _flights[key] = flight
+
+    if is_leader:
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with _flights_lock:
+                _flights.pop(key, None)
+            flight.done.set()
+    else:
+        logging.info(f"Joining in-flight {endpoint} request for {key}")
+        flight.done.wait()
+
+    if flight.error is not None:
+        raise flight.error
+    return flight.result
+
 @app.post("/attack/run")
 def run_attack(payload: dict = Body(...)):
-    technique_id = payload.get("technique_id")
+    technique_id = str(payload.get("technique_id") or "").strip()
     if not technique_id:
         return JSONResponse({"error": "No technique_id provided"}, status_code=400)
 
     logging.info(f"POST /attack/run called with technique_id={technique_id}")
+    return single_flight("/attack/run", {"technique_id": technique_id}, lambda: _run_attack(technique_id))
+
+
+# Per-phase stratus timeouts in seconds, overridable via env/.env (e.g. STRATUS_WARMUP_TIMEOUT=1200)
+PHASE_TIMEOUT_DEFAULTS = {"warmup": 900, "detonate": 300, "cleanup": 900, "revert": 600}
+# Seconds to wait for remaining output from a process group after it has been killed
+KILL_GRACE_SECONDS = 10
+
+def _phase_timeout(phase: str) -> float:
+    value = os.getenv(f"STRATUS_{phase.upper()}_TIMEOUT", "")
+    if not value:
+        return float(PHASE_TIMEOUT_DEFAULTS[phase])
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = 0
+    # Also rejects nan/inf, which would disable the timeout
+    if not 0 < timeout < float("inf"):
+        logging.warning(f"Invalid STRATUS_{phase.upper()}_TIMEOUT={value!r}, using default.")
+        return float(PHASE_TIMEOUT_DEFAULTS[phase])
+    return timeout
+
+def _cleanup_after_kill_default() -> bool:
+    return os.getenv("STRATUS_CLEANUP_AFTER_KILL", "true").strip().lower() not in ("0", "false", "no")
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    """Kill a stratus process together with its terraform children."""
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError as e:
+        logging.warning(f"Could not kill process group {proc.pid}: {e}")
+
+class _ActiveRun:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.proc = None
+        self.phase = None
+        self.killed_proc = None
+        self.cancelled = threading.Event()
+        self.cleanup_after_cancel = _cleanup_after_kill_default()
+
+    def kill_current(self) -> None:
+        """Kill the running phase. Caller must hold self.lock."""
+        if self.proc is not None:
+            self.killed_proc = self.proc
+            _kill_process_group(self.proc)
+
+# technique_id -> run currently executing phases for it (single-flight guarantees at most one)
+_active_runs: Dict[str, _ActiveRun] = {}
+_active_runs_lock = threading.Lock()
+
+def _run_phase(phase: str, technique_id: str, env=None, run: _ActiveRun = None) -> Tuple[subprocess.CompletedProcess, str]:
+    """Run one stratus phase in its own process group.
+
+    Returns (result, status) where status is 'completed', 'timeout' or 'cancelled'.
+    On timeout or cancellation the whole process group is killed.
+    """
+    timeout = _phase_timeout(phase)
+    group_kwargs = (
+        {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+    )
+    logging.info(f"Running {phase} for {technique_id} (timeout {timeout:.0f}s).")
+    proc = subprocess.Popen(
+        [EXE_PATH, phase, technique_id],
+        cwd=V2_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env,
+        **group_kwargs
+    )
+    if run is not None:
+        with run.lock:
+            run.proc, run.phase = proc, phase
+            # A cancel that raced with startup must still stop this phase (cleanup is exempt)
+            if run.cancelled.is_set() and phase != "cleanup":
+                run.kill_current()
+
+    status = "completed"
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logging.error(f"{phase} for {technique_id} exceeded {timeout:.0f}s; killing process group.")
+        status = "timeout"
+        _kill_process_group(proc)
+        try:
+            stdout, stderr = proc.communicate(timeout=KILL_GRACE_SECONDS)
+        except subprocess.TimeoutExpired:
+            stdout, stderr = "", ""
+    finally:
+        if run is not None:
+            with run.lock:
+                run.proc = None
+
+    if run is not None and run.killed_proc is proc:
+        status = "cancelled"
+    return subprocess.CompletedProcess(proc.args, proc.returncode, stdout or "", stderr or ""), status
+
+
+def _skipped_phase(phase: str, technique_id: str) -> subprocess.CompletedProcess:
+    return subprocess.CompletedProcess([EXE_PATH, phase, technique_id], None, "", "")
+
+
+# Raw phase output is stored gzip-compressed per run and served in line ranges;
+# run responses and attack logs carry only per-phase summaries and line counts.
+RUNS_DIR = os.path.join(os.path.dirname(__file__), "attack-runs")
+RUN_PHASES = ("warmup", "detonate", "cleanup")
+RUN_STREAMS = ("stdout", "stderr")
+RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+OUTPUT_TAIL_LINES = 5
+OUTPUT_PAGE_LINES = 1000
+OUTPUT_MAX_PAGE_LINES = 10000
+# Bounded excerpt of stored output that /generate-report adds to the per-phase summaries
+REPORT_EXCERPT_LINES = 20
+REPORT_EXCERPT_LINE_CHARS = 500
+
+def _new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def _run_output_path(run_id: str, phase: str, stream: str) -> str:
+    return os.path.join(RUNS_DIR, run_id, f"{phase}.{stream}.log.gz")
+
+def _store_phase_output(run_id: str, phase: str, result: subprocess.CompletedProcess, status: str) -> Dict[str, Any]:
+    """Write a phase's stdout/stderr compressed to disk and return its summary."""
+    summary = {"status": status, "returncode": result.returncode}
+    for stream in RUN_STREAMS:
+        lines = (getattr(result, stream) or "").strip().splitlines()
+        with _open_log(_run_output_path(run_id, phase, stream), "wt") as f:
+            for line in lines:
+                f.write(line)
+                f.write("\n")
+        summary[f"{stream}_lines"] = len(lines)
+        summary[f"{stream}_tail"] = lines[-OUTPUT_TAIL_LINES:]
+    return summary
+
+def _iter_run_output(run_id: str, phase: str, stream: str) -> Iterator[str]:
+    path = _run_output_path(run_id, phase, stream)
+    if not os.path.exists(path):
+        return
+    with _open_log(path) as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+def _with_output_excerpt(record: Any) -> Any:
+    """Add the first lines of each phase's stored output to a run-summary attack log record.
+
+    The full output stays on disk; the report works from the summaries, tails and this bounded excerpt.
+    """
+    if not isinstance(record, dict) or not record.get("run_id") or not isinstance(record.get("phases"), dict):
+        return record
+    run_id = str(record["run_id"])
+    # The record comes from a caller-chosen log file, so never trust run_id as a path component
+    if not RUN_ID_PATTERN.match(run_id):
+        logging.warning(f"Ignoring invalid run_id {run_id!r} in attack log.")
+        return record
+
+    excerpted = dict(record, phases={})
+    for phase, summary in record["phases"].items():
+        if phase not in RUN_PHASES or not isinstance(summary, dict):
+            continue
+        summary = dict(summary)
+        for stream in RUN_STREAMS:
+            head = itertools.islice(_iter_run_output(run_id, phase, stream), REPORT_EXCERPT_LINES)
+            summary[f"{stream}_head"] = [line[:REPORT_EXCERPT_LINE_CHARS] for line in head]
+            summary[f"{stream}_tail"] = [
+                str(line)[:REPORT_EXCERPT_LINE_CHARS] for line in summary.get(f"{stream}_tail", [])
+            ]
+        excerpted["phases"][phase] = summary
+    return excerpted
+
+
+def _run_attack(technique_id: str):
     ensure_stratus_built()
     ensure_aws_env()
 
     env = os.environ.copy()  # use only what's in env / .env
     logging.info("Using AWS environment variables from env/.env")
 
-    # Warmup
-    logging.info(f"Running warmup for {technique_id}.")
-    warmup = subprocess.run(
-        [EXE_PATH, "warmup", technique_id],
-        cwd=V2_DIR, capture_output=True, text=True, env=env
-    )
-
-    # Detonate
-    logging.info(f"Running detonate for {technique_id}.")
-    detonate = subprocess.run(
-        [EXE_PATH, "detonate", technique_id],
-        cwd=V2_DIR, capture_output=True, text=True, env=env
-    )
-
-    logging.info("Waiting 10 seconds before cleanup...")
-    time.sleep(10)
+    run = _ActiveRun()
+    with _active_runs_lock:
+        _active_runs[technique_id] = run
+    try:
+        phase_status = {}
 
-    # Cleanup
-    logging.info(f"Running cleanup for {technique_id}.")
-    cleanup = subprocess.run(
-        [EXE_PATH, "cleanup", technique_id],
-        cwd=V2_DIR, capture_output=True, text=True, env=env
-    )
+        # Warmup
+        warmup, phase_status["warmup"] = _run_phase("warmup", technique_id, env, run)
+        killed = phase_status["warmup"] != "completed"
 
-    # Prepare result JSON (split into lists of lines for readability)
+        # Detonate
+        detonated_at = time.time()
+        if killed:
+            detonate, phase_status["detonate"] = _skipped_phase("detonate", technique_id), "skipped"
+        else:
+            detonate, phase_status["detonate"] = _run_phase("detonate", technique_id, env, run)
+            killed = phase_status["detonate"] != "completed"
+
+        if not killed:
+            logging.info("Waiting 10 seconds before cleanup...")
+            # A cancel ends the wait early
+            run.cancelled.wait(10)
+
+        # Cleanup (after a kill only if configured, or requested by the cancel call)
+        killed = killed or run.cancelled.is_set()
+        if killed and not run.cleanup_after_cancel:
+            logging.info(f"Skipping cleanup for {technique_id} after kill.")
+            cleanup, phase_status["cleanup"] = _skipped_phase("cleanup", technique_id), "skipped"
+        else:
+            cleanup, phase_status["cleanup"] = _run_phase("cleanup", technique_id, env, run)
+    finally:
+        with _active_runs_lock:
+            _active_runs.pop(technique_id, None)
+
+    # Store raw output compressed; the result only carries summaries and line counts
+    run_id = _new_run_id()
+    os.makedirs(os.path.join(RUNS_DIR, run_id), exist_ok=True)
+    phase_results = {"warmup": warmup, "detonate": detonate, "cleanup": cleanup}
     result = {
         "technique_id": technique_id,
-        "warmup_output": warmup.stdout.strip().splitlines(),
-        "warmup_error": warmup.stderr.strip().splitlines(),
-        "detonate_output": detonate.stdout.strip().splitlines(),
-        "detonate_error": detonate.stderr.strip().splitlines(),
-        "cleanup_output": cleanup.stdout.strip().splitlines(),
-        "cleanup_error": cleanup.stderr.strip().splitlines(),
+        "run_id": run_id,
+        "status": "completed" if all(v == "completed" for v in phase_status.values()) else "aborted",
+        "phases": {
+            phase: _store_phase_output(run_id, phase, phase_results[phase], phase_status[phase])
+            for phase in RUN_PHASES
+        },
+        "output_url": f"/attack/runs/{run_id}/output",
     }
+    with open(os.path.join(RUNS_DIR, run_id, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f)
 
     # Ensure logs folder exists
     logs_dir = os.path.join(os.path.dirname(__file__), "attack-logs")
     os.makedirs(logs_dir, exist_ok=True)
 
-    # Save logs to JSON file
-    log_file = os.path.join(logs_dir, f"{technique_id}.json")
-    with open(log_file, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=4)
+    # Save logs to JSON Lines file
+    log_file = os.path.join(logs_dir, _log_filename(technique_id))
+    write_log_records(log_file, [result])
 
     logging.info(f"Attack logs saved to {log_file}")
+    # Only runs that actually detonated count towards coverage
+    if phase_status["detonate"] == "completed":
+        record_attack_run(technique_id, detonated_at)
     return JSONResponse(result)
 
 
+@app.post("/attack/cancel")
+def cancel_attack(payload: dict = Body(...)):
+    technique_id = str(payload.get("technique_id") or "").strip()
+    if not technique_id:
+        return JSONResponse({"error": "No technique_id provided"}, status_code=400)
+
+    with _active_runs_lock:
+        run = _active_runs.get(technique_id)
+    if run is None:
+        return JSONResponse({"error": f"No running attack for {technique_id}"}, status_code=404)
+
+    with run.lock:
+        cleanup_disabled = "cleanup" in payload and not payload.get("cleanup")
+        if "cleanup" in payload:
+            run.cleanup_after_cancel = bool(payload.get("cleanup"))
+        run.cancelled.set()
+        phase = run.phase
+        # Killing cleanup would leave cloud resources behind with no retry, so (as for the startup
+        # race in _run_phase) it is left to finish unless the caller explicitly disabled cleanup
+        cleanup_left_running = phase == "cleanup" and run.proc is not None and not cleanup_disabled
+        if not cleanup_left_running:
+            run.kill_current()
+
+    logging.info(
+        f"Cancellation requested for {technique_id} during {phase or 'startup'}"
+        + ("; cleanup left running." if cleanup_left_running else ".")
+    )
+    return JSONResponse({
+        "message": f"Cancellation requested for {technique_id}",
+        "phase": phase,
+        "cleanup": run.cleanup_after_cancel or cleanup_left_running,
+        "cleanup_left_running": cleanup_left_running,
+    })
+
+
+@app.get("/attack/runs/{run_id}/output")
+def get_run_output(
+    run_id: str,
+    phase: str,
+    stream: str = "stdout",
+    from_line: int = Query(0, alias="from", ge=0),
+    to_line: int = Query(None, alias="to", ge=0),
+):
+    try:
+        if not RUN_ID_PATTERN.match(run_id):
+            return JSONResponse({"error": f"Invalid run id: {run_id}"}, status_code=400)
+        if phase not in RUN_PHASES:
+            return JSONResponse({"error": f"phase must be one of {', '.join(RUN_PHASES)}"}, status_code=400)
+        if stream not in RUN_STREAMS:
+            return JSONResponse({"error": f"stream must be one of {', '.join(RUN_STREAMS)}"}, status_code=400)
+        if to_line is not None and to_line < from_line:
+            return JSONResponse({"error": "to must not be less than from"}, status_code=400)
+
+        summary_path = os.path.join(RUNS_DIR, run_id, "summary.json")
+        if not os.path.exists(summary_path):
+            return JSONResponse({"error": f"Run not found: {run_id}"}, status_code=404)
+        with open(summary_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+
+        total = summary["phases"][phase][f"{stream}_lines"]
+        end = to_line if to_line is not None else from_line + OUTPUT_PAGE_LINES
+        end = min(end, from_line + OUTPUT_MAX_PAGE_LINES, total)
+        lines = list(itertools.islice(_iter_run_output(run_id, phase, stream), from_line, max(end, from_line)))
+
+        return JSONResponse({
+            "run_id": run_id,
+            "phase": phase,
+            "stream": stream,
+            "from": from_line,
+            "to": from_line + len(lines),
+            "total_lines": total,
+            "lines": lines,
+            "next_from": end if end < total else None,
+        })
+    except Exception as e:
+        logging.exception("Failed to read run output")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
 @app.post('/undo/s3')
 def undo_attack_s3():
     logging.info('POST /undo/s3 called.')
     ensure_stratus_built()
-    logging.info('Running revert for aws.exfiltration.ec2-share-ami.')
-    result = subprocess.run([EXE_PATH, 'revert', 'aws.exfiltration.ec2-share-ami'], cwd=V2_DIR, capture_output=True, text=True)
+    result, status = _run_phase('revert', 'aws.exfiltration.ec2-share-ami')
     logging.info('Revert stdout: %s', result.stdout)
     logging.info('Revert stderr: %s', result.stderr)
-    return JSONResponse({'output': result.stdout, 'error': result.stderr})
+    return JSONResponse({'output': result.stdout, 'error': result.stderr, 'status': status})
+
+@app.get("/coverage")
+def get_coverage():
+    with _coverage_lock:
+        techniques = [_format_rollup(k, v) for k, v in sorted(_coverage["techniques"].items())]
+        tactics = [_format_rollup(k, v) for k, v in sorted(_coverage["tactics"].items())]
+        pending = len(_coverage["pending"])
+    return JSONResponse({"techniques": techniques, "tactics": tactics, "pending_runs": pending})
 
 @app.get("/ping")
 def ping():
@@ -235,6 +823,14 @@ def save_openai_key(payload: dict = Body(...)):
     
 @app.post("/fetch-cloudtrail-logs")
 def fetch_cloudtrail_logs(payload: dict = Body(...)):
+    return single_flight("/fetch-cloudtrail-logs", payload, lambda: _fetch_cloudtrail_logs(payload))
+
+
+# EventName looked up by /fetch-cloudtrail-logs; coverage only resolves runs expecting this event
+CLOUDTRAIL_LOOKUP_EVENT_NAME = "StopLogging"
+
+
+def _fetch_cloudtrail_logs(payload: Dict[str, Any]):
     try:
         user_curl = payload.get("curl", "")
 
@@ -244,7 +840,7 @@ def fetch_cloudtrail_logs(payload: dict = Body(...)):
         # Define output file
         logs_dir = os.path.join(os.path.dirname(__file__), "cloudtrail-logs")
         os.makedirs(logs_dir, exist_ok=True)
-        log_file = os.path.join(logs_dir, "Detection_Logs.json")
+        log_file = os.path.join(logs_dir, _log_filename("Detection_Logs"))
 
         # Use region from environment (saved via /save-aws-config), fallback to us-east-1
         region = os.getenv("AWS_REGION", "us-east-1")
@@ -252,7 +848,7 @@ def fetch_cloudtrail_logs(payload: dict = Body(...)):
         # Build AWS CLI command (CloudTrail supports a single --lookup-attributes per call)
         cmd = [
             "aws", "cloudtrail", "lookup-events",
-            "--lookup-attributes", "AttributeKey=EventName,AttributeValue=StopLogging",
+            "--lookup-attributes", f"AttributeKey=EventName,AttributeValue={CLOUDTRAIL_LOOKUP_EVENT_NAME}",
             "--max-results", "60",
             "--region", region,
             "--output", "json"
@@ -274,6 +870,7 @@ def fetch_cloudtrail_logs(payload: dict = Body(...)):
         logs_json = json.loads(result.stdout)
 
         # Optionally filter by the stratus user if present
+        filtered = []
         try:
             events = logs_json.get("Events", [])
             filtered = [e for e in events if e.get("Username") == "stratus-redteam-cli-user"]
@@ -283,9 +880,11 @@ def fetch_cloudtrail_logs(payload: dict = Body(...)):
             # Keep original if filtering fails
             pass
 
-        # Save logs (post-filter)
-        with open(log_file, "w", encoding="utf-8") as f:
-            json.dump(logs_json, f, indent=2)
+        # Save logs (post-filter), one compact event per line
+        write_log_records(log_file, logs_json.get("Events", []))
+
+        # Only events attributed to the stratus user count towards coverage
+        record_detection_fetch(filtered, time.time(), [CLOUDTRAIL_LOOKUP_EVENT_NAME])
 
         return JSONResponse({
             "message": "Detection logs fetched successfully",
@@ -641,32 +1240,8 @@ def _render_simple_pdf(markdown_text: str, pdf_path: str) -> None:
     c.save()
 
 
-@app.post("/generate-report")
-def generate_report(payload: dict = Body(...)):
-    try:
-        # Paths
-        backend_dir = os.path.dirname(__file__)
-        attack_logs_path = os.path.join(backend_dir, "attack-logs", "aws.defense-evasion.cloudtrail-stop.json")
-        cloudtrail_logs_path = os.path.join(backend_dir, "cloudtrail-logs", "Detection_Logs.json")
-
-        # Allow payload overrides for custom paths
-        attack_logs_path = payload.get("attackLogsPath", attack_logs_path)
-        cloudtrail_logs_path = payload.get("cloudtrailLogsPath", cloudtrail_logs_path)
-
-        # Read JSON inputs
-        if not os.path.exists(attack_logs_path):
-            return JSONResponse({"error": f"Attack log not found at {attack_logs_path}"}, status_code=400)
-        if not os.path.exists(cloudtrail_logs_path):
-            return JSONResponse({"error": f"CloudTrail log not found at {cloudtrail_logs_path}"}, status_code=400)
-
-        with open(attack_logs_path, "r", encoding="utf-8") as f:
-            attack_json = json.load(f)
-        with open(cloudtrail_logs_path, "r", encoding="utf-8") as f:
-            cloudtrail_json = json.load(f)
-
-        # Build the updated prompt (to match your report.docx style + MITRE Mapping)
-        full_prompt = f"""
-You are a senior cloud security analyst. Compare two JSON files:
+# Report structure shared by direct and chunked generation
+REPORT_STRUCTURE_PROMPT = """You are a senior cloud security analyst. Compare two JSON files:
 1. ATTACK_LOG_JSON (from red-team framework, e.g., aws.defense-evasion.cloudtrail-stop.json)
 2. DETECTION_LOG_JSON (from security product, e.g., Detection_Logs.json)
 
@@ -710,29 +1285,232 @@ For example:
 - **Technique:** T1562.002 – Impair Defenses: Disable CloudTrail Logging  
 - **Tactic:** Defense Evasion
 
-=== INPUT DATA ===
+"""
+
+CHUNK_SUMMARY_PROMPT = """
+You are a senior cloud security analyst. Below is chunk {index} of a DETECTION_LOG_JSON
+(CloudTrail events recorded by a security product during a red-team exercise).
+
+Summarize this chunk factually for a later report. For every distinct event name list:
+- event name, user/actor, event source, timestamps (first/last), count
+- userAgent and source IP if present, and any error codes
+Keep it concise, do not speculate, and do not write recommendations.
+
+=== EVENTS ===
+{events}
+"""
+
+MERGE_SUMMARIES_PROMPT = """
+You are a senior cloud security analyst. Below are partial summaries of consecutive chunks of a
+DETECTION_LOG_JSON. Merge them into one summary in the same format: combine entries for the same
+event name (add up counts, keep the earliest first and latest last timestamps) and keep every distinct
+user/actor, userAgent, source IP and error code. Keep it concise and do not speculate.
+
+=== SUMMARIES ===
+{summaries}
+"""
+
+REPORT_MODES = ("auto", "direct", "chunked")
+# Smallest accepted chunkTokens; tinier chunks would cost one model call per handful of events
+MIN_CHUNK_TOKENS = 1000
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        logging.warning(f"Invalid {name}={value!r}, using {default}.")
+        return default
+    return number
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough heuristic for English/JSON text; avoids pulling in a tokenizer
+    return len(text) // 4
+
+
+def _chat_completion(client: OpenAI, prompt: str) -> str:
+    completion = client.chat.completions.create(
+        model="gpt-4o",
+        messages=[
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.2,
+    )
+    return completion.choices[0].message.content if completion and completion.choices else ""
+
+
+def _iter_chunks(events: Iterable[Any], token_budget: int) -> Iterator[List[Any]]:
+    """Greedily pack events into chunks whose serialized size stays within token_budget."""
+    current, current_tokens = [], 0
+    for event in events:
+        event_tokens = _estimate_tokens(json.dumps(event))
+        if current and current_tokens + event_tokens > token_budget:
+            yield current
+            current, current_tokens = [], 0
+        current.append(event)
+        current_tokens += event_tokens
+    if current:
+        yield current
+
+
+def _report_overhead_tokens(attack_json: Any, payload: Dict[str, Any]) -> int:
+    """Tokens the report prompt spends on everything except the detection log."""
+    return _estimate_tokens(REPORT_STRUCTURE_PROMPT + json.dumps(attack_json) + str(payload.get("instructions", "")))
+
+
+def _batch_summaries(summaries: List[str], token_budget: int) -> List[List[str]]:
+    """Greedily group summaries under token_budget. Every batch holds at least two summaries so each
+    reduce round strictly shrinks the list, even when single summaries are near the budget."""
+    batches, current, current_tokens = [], [], 0
+    for summary in summaries:
+        summary_tokens = _estimate_tokens(summary)
+        if len(current) >= 2 and current_tokens + summary_tokens > token_budget:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += summary_tokens
+    if len(current) == 1 and batches:
+        batches[-1].append(current[0])
+    elif current:
+        batches.append(current)
+    return batches
+
+
+def _reduce_summaries(client: OpenAI, summaries: List[str], batch_tokens: int, target_tokens: int, max_workers: int) -> List[str]:
+    """Merge summaries in batches of at most batch_tokens, round after round, until together they fit target_tokens."""
+    rounds = 0
+    while len(summaries) > 1 and sum(_estimate_tokens(s) for s in summaries) > target_tokens:
+        batches = _batch_summaries(summaries, batch_tokens)
+        prompts = [MERGE_SUMMARIES_PROMPT.format(summaries="\n\n---\n\n".join(batch)) for batch in batches]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            summaries = list(pool.map(lambda prompt: _chat_completion(client, prompt), prompts))
+        rounds += 1
+        logging.info(f"Reduce round {rounds}: merged into {len(summaries)} summaries.")
+    return summaries
+
+
+def _generate_report_chunked(client: OpenAI, attack_json: Any, events: Iterable[Any], payload: Dict[str, Any]) -> str:
+    """Summarize detection-log chunks concurrently as they stream in, then merge the summaries into the report."""
+    chunk_tokens = payload.get("chunkTokens") or max(_env_int("REPORT_CHUNK_TOKENS", 20000), MIN_CHUNK_TOKENS)
+    max_workers = _env_int("REPORT_MAX_WORKERS", 4)
+
+    summaries: List[str] = []
+    event_count = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        in_flight = deque()
+        for index, chunk in enumerate(_iter_chunks(events, chunk_tokens), 1):
+            event_count += len(chunk)
+            prompt = CHUNK_SUMMARY_PROMPT.format(index=index, events=json.dumps(chunk))
+            in_flight.append(pool.submit(_chat_completion, client, prompt))
+            # Bound the number of pending chunks so memory stays flat regardless of log size
+            if len(in_flight) >= max_workers * 2:
+                summaries.append(in_flight.popleft().result())
+        summaries.extend(future.result() for future in in_flight)
+    logging.info(f"Summarized {event_count} detection events in {len(summaries)} chunks ({max_workers} workers).")
+
+    # The final prompt must fit the direct budget alongside the template and attack log
+    chunk_count = len(summaries)
+    target_tokens = max(_env_int("REPORT_DIRECT_MAX_TOKENS", 60000) - _report_overhead_tokens(attack_json, payload), 1)
+    summaries = _reduce_summaries(client, summaries, chunk_tokens, target_tokens, max_workers)
+
+    summaries_text = "\n\n".join(f"### Chunk {i}\n{summary}" for i, summary in enumerate(summaries, 1))
+    merge_prompt = f"""
+{REPORT_STRUCTURE_PROMPT}=== INPUT DATA ===
+The detection log was too large for one request. It contained {event_count} events, summarized in
+{chunk_count} chunks and merged into the summaries below; treat them together as the DETECTION_LOG_JSON.
 - ATTACK_LOG_JSON: {json.dumps(attack_json)}
-- DETECTION_LOG_JSON: {json.dumps(cloudtrail_json)}
+- DETECTION_LOG_SUMMARIES:
+{summaries_text}
 
 {payload.get('instructions', '')}
 """
+    return _chat_completion(client, merge_prompt)
+
+
+@app.post("/generate-report")
+def generate_report(payload: dict = Body(...)):
+    try:
+        mode = payload.get("mode", "auto")
+        if mode not in REPORT_MODES:
+            return JSONResponse({"error": f"mode must be one of {', '.join(REPORT_MODES)}"}, status_code=400)
+        event_names = payload.get("eventNames")
+        if event_names is not None and (
+            not isinstance(event_names, list) or not all(isinstance(n, str) for n in event_names)
+        ):
+            return JSONResponse({"error": "eventNames must be a list of event name strings"}, status_code=400)
+        chunk_tokens = payload.get("chunkTokens")
+        if chunk_tokens is not None and (
+            not isinstance(chunk_tokens, int) or isinstance(chunk_tokens, bool) or chunk_tokens < MIN_CHUNK_TOKENS
+        ):
+            return JSONResponse({"error": f"chunkTokens must be an integer >= {MIN_CHUNK_TOKENS}"}, status_code=400)
+
+        # Paths
+        backend_dir = os.path.dirname(__file__)
+        attack_logs_path = _find_log(os.path.join(backend_dir, "attack-logs"), "aws.defense-evasion.cloudtrail-stop")
+        cloudtrail_logs_path = _find_log(os.path.join(backend_dir, "cloudtrail-logs"), "Detection_Logs")
+
+        # Allow payload overrides for custom paths
+        attack_logs_path = payload.get("attackLogsPath", attack_logs_path)
+        cloudtrail_logs_path = payload.get("cloudtrailLogsPath", cloudtrail_logs_path)
+
+        # Check log inputs (.jsonl, .jsonl.gz or legacy .json)
+        if not os.path.exists(attack_logs_path):
+            return JSONResponse({"error": f"Attack log not found at {attack_logs_path}"}, status_code=400)
+        if not os.path.exists(cloudtrail_logs_path):
+            return JSONResponse({"error": f"CloudTrail log not found at {cloudtrail_logs_path}"}, status_code=400)
 
-        # Call OpenAI
         api_key = os.getenv("OPENAI_API_KEY", "").strip()
         if not api_key:
             return JSONResponse({"error": "OPENAI_API_KEY not set. Use /save-openai-key first."}, status_code=400)
 
         client = OpenAI(api_key=api_key)
 
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "user", "content": full_prompt},
-            ],
-            temperature=0.2,
-        )
+        attack_records = [_with_output_excerpt(r) for r in iter_log_records(attack_logs_path)]
+        attack_json = attack_records[0] if len(attack_records) == 1 else attack_records
+
+        # Detection events are streamed; optionally keep only selected event names
+        events = iter_log_records(cloudtrail_logs_path)
+        if event_names:
+            wanted = set(event_names)
+            events = (e for e in events if isinstance(e, dict) and e.get("EventName") in wanted)
+
+        # "direct" sends the whole detection log in one prompt; "chunked" map-reduces it.
+        # "auto" (default) buffers events up to the direct budget and switches to chunked beyond it.
+        # The budget covers the whole prompt, so the template and attack log count against it.
+        buffered = []
+        if mode != "chunked":
+            budget = _env_int("REPORT_DIRECT_MAX_TOKENS", 60000) - _report_overhead_tokens(attack_json, payload)
+            buffered_tokens = 0
+            for event in events:
+                buffered.append(event)
+                buffered_tokens += _estimate_tokens(json.dumps(event))
+                if mode == "auto" and buffered_tokens > budget:
+                    mode = "chunked"
+                    break
+            else:
+                mode = "direct"
+        logging.info(f"Generating report in {mode} mode.")
+
+        if mode == "chunked":
+            content = _generate_report_chunked(client, attack_json, itertools.chain(buffered, events), payload)
+        else:
+            cloudtrail_json = {"Events": buffered}
+            # Build the updated prompt (to match your report.docx style + MITRE Mapping)
+            full_prompt = f"""
+{REPORT_STRUCTURE_PROMPT}=== INPUT DATA ===
+- ATTACK_LOG_JSON: {json.dumps(attack_json)}
+- DETECTION_LOG_JSON: {json.dumps(cloudtrail_json)}
+
+{payload.get('instructions', '')}
+"""
+            content = _chat_completion(client, full_prompt)
 
-        content = completion.choices[0].message.content if completion and completion.choices else ""
         if not content:
             return JSONResponse({"error": "Empty response from model"}, status_code=500)
 